@@ -9,8 +9,9 @@ for the runner VM. It performs the following high-level steps:
 - Prepares directories for the runner workdir, persisting them on the
   stateful partition and bind-mounting into their runtime locations.
 - Configures Docker (auth and daemon.json) to use an Artifact Registry
-  virtual repository in the current region as a mirror, then reloads Docker.
-- Creates and enables a systemd unit that runs the GitHub Actions runner
+  virtual repository in the current region as a mirror, then reloads Docker
+  if it is active.
+- Creates and starts a systemd unit that runs the GitHub Actions runner
   in a container, and powers off the VM when the job completes.
 
 Notes
@@ -20,18 +21,52 @@ Notes
 """
 
 import base64
+import concurrent.futures
+import ctypes
+import functools
 import json
 import logging
 import os
+import shutil
 import subprocess
 import sys
 import urllib.request
 from http.client import HTTPResponse
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # COS images only ship the standard library
+    orjson = None  # type: ignore[assignment]
 
 logger = logging.getLogger(__name__)
 
+# Initialize the json encoder/decoder up front so the first log record on the
+# boot path doesn't pay for it.
+json.dumps(None)
+json.loads("{}")
+
+# Resolve executables once so each spawn can exec directly instead of searching $PATH
+DOCKER = shutil.which("docker") or "/usr/bin/docker"
+SYSTEMCTL = shutil.which("systemctl") or "/usr/bin/systemctl"
+
+# Runner image, pulled through the regional Artifact Registry virtual repository
+RUNNER_IMAGE = "actions/actions-runner:latest"
+
+# Upper bound on how long the startup script waits for the image prefetch
+PREFETCH_TIMEOUT_SECONDS = 300
+
+# mount(2) flags from <sys/mount.h>
+MS_NODEV = 4
+MS_REMOUNT = 32
+MS_BIND = 4096
+MS_RELATIME = 1 << 21
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.mount.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_ulong, ctypes.c_void_p]
+_libc.mount.restype = ctypes.c_int
+
 
 class GCPJSONFormatter(logging.Formatter):
     """JSON formatter optimized for GCP Cloud Logging.
@@ -40,14 +75,26 @@ class GCPJSONFormatter(logging.Formatter):
     so severity, source location, and timestamps are parsed and indexed.
     """
 
+    if orjson is not None:
+        @staticmethod
+        def _dumps(value: Any) -> str:
+            # Match json.dumps, which accepts non-str keys in caller extras
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    else:
+        _dumps = staticmethod(json.dumps)
+
+    _COMPONENT = "github-actions-runner"
+
     def format(self, record: logging.LogRecord) -> str:  # type: ignore[override]
+        seconds, fraction = divmod(record.created, 1)
+
         # Build the log entry following GCP Cloud Logging structure
         log_entry: Dict[str, Any] = {
             "severity": record.levelname or "DEFAULT",
             "message": record.getMessage(),
             "timestamp": {
-                "seconds": int(record.created),
-                "nanos": int((record.created % 1) * 1_000_000_000),
+                "seconds": int(seconds),
+                "nanos": int(fraction * 1_000_000_000),
             },
             "sourceLocation": {
                 "file": record.pathname,
@@ -55,7 +102,7 @@ class GCPJSONFormatter(logging.Formatter):
                 "function": record.funcName,
             },
             "labels": {
-                "component": "github-actions-runner",
+                "component": self._COMPONENT,
                 "module": record.module,
             },
         }
@@ -68,23 +115,34 @@ class GCPJSONFormatter(logging.Formatter):
         if hasattr(record, "extra_fields"):
             log_entry.update(record.extra_fields)  # type: ignore[arg-type]
 
-        return json.dumps(log_entry)
+        return self._dumps(log_entry)
 
 
-def get_project_id() -> str:
-    """Return the current GCP project ID via the metadata server."""
+def _metadata_get(path: str) -> bytes:
+    """Return the raw value at `path` from the GCE metadata server.
+
+    Callers strip the bytes before decoding so the (potentially multi-KB) value
+    is only copied once; all the values read here are plain ASCII.
+    """
     # The metadata server is only reachable from within a GCE VM.
     req = urllib.request.Request(
-        "http://metadata.google.internal/computeMetadata/v1/project/project-id",
+        f"http://metadata.google.internal/computeMetadata/v1/{path}",
         headers={"Metadata-Flavor": "Google"},
     )
     response: HTTPResponse
     with urllib.request.urlopen(req, timeout=10) as response:
-        project_id = response.read().decode("utf-8").strip()
-        logger.debug(f"Retrieved project ID: {project_id}")
-        return project_id
+        return response.read()
+
+
+@functools.lru_cache(maxsize=None)
+def get_project_id() -> str:
+    """Return the current GCP project ID via the metadata server."""
+    project_id = _metadata_get("project/project-id").strip().decode("ascii")
+    logger.debug(f"Retrieved project ID: {project_id}")
+    return project_id
 
 
+@functools.lru_cache(maxsize=None)
 def get_region() -> str:
     """Return the region derived from the VM's zone via the metadata server.
 
@@ -92,33 +150,36 @@ def get_region() -> str:
       projects/<num>/zones/<region>-<zone-suffix>
     This function returns just the `<region>` portion.
     """
-    req = urllib.request.Request(
-        "http://metadata.google.internal/computeMetadata/v1/instance/zone",
-        headers={"Metadata-Flavor": "Google"},
-    )
-    response: HTTPResponse
-    with urllib.request.urlopen(req, timeout=10) as response:
-        zone_path = response.read().decode("utf-8").strip()
-        logger.debug(f"Retrieved zone path: {zone_path}")
-        # Zone format: projects/12345/zones/us-central1-a
-        zone = zone_path.partition("/zones/")[-1]
-        region = zone.rsplit("-", 1)[0]
-        return region
+    zone_path = _metadata_get("instance/zone").strip().decode("ascii")
+    logger.debug(f"Retrieved zone path: {zone_path}")
+    # Zone format: projects/12345/zones/us-central1-a
+    zone = zone_path.partition("/zones/")[-1]
+    region = zone.rsplit("-", 1)[0]
+    return region
 
 
+@functools.lru_cache(maxsize=None)
 def get_jitconfig() -> str:
     """Return the GitHub runner JIT configuration from instance metadata.
 
     The `JIT_CONFIG` attribute is expected to be attached to the instance
     and consumed by `actions/runner` for just-in-time configuration.
     """
-    req = urllib.request.Request(
-        "http://metadata.google.internal/computeMetadata/v1/instance/attributes/JIT_CONFIG",
-        headers={"Metadata-Flavor": "Google"},
-    )
-    response: HTTPResponse
-    with urllib.request.urlopen(req, timeout=10) as response:
-        return response.read().decode("utf-8")
+    return _metadata_get("instance/attributes/JIT_CONFIG").strip().decode("ascii")
+
+
+def _load_json(data: bytes) -> Any:
+    """Parse a JSON document, using `orjson` when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dump_json(value: Any) -> bytes:
+    """Serialize `value` as indented JSON, using `orjson` when available."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2)
+    return json.dumps(value, indent=2).encode("utf-8")
 
 
 def fetch_secret(secret_name: str, project_id: str, access_token: str) -> Dict[str, Any]:
@@ -147,6 +208,20 @@ def fetch_secret(secret_name: str, project_id: str, access_token: str) -> Dict[s
         return json.loads(payload)
 
 
+def _mount(source: Optional[str], target: str, flags: int) -> None:
+    """Call mount(2) directly, avoiding a fork/exec of mount(8)."""
+    result = _libc.mount(
+        source.encode() if source is not None else None,
+        target.encode(),
+        None,
+        flags,
+        None,
+    )
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno), target)
+
+
 def configure_runner_dirs() -> None:
     """Create and bind-mount the runner work directory onto a stateful path.
 
@@ -154,41 +229,40 @@ def configure_runner_dirs() -> None:
     persists across reboots. We place the runner workdir there and bind-mount
     it to `/var/lib/github` for the container to use as `_work`.
     """
-    # Ensure destination exists with permissive mode (runner container writes here)
-    subprocess.check_call(
-        [
-            "install",
-            "--directory",
-            "--owner",
-            "root",
-            "--group",
-            "root",
-            "--mode",
-            "0777",
-            "--verbose",
-            "/mnt/stateful_partition/var/lib/github",
-        ]
-    )
+    stateful_dir = "/mnt/stateful_partition/var/lib/github"
 
-    # Bind-mount stateful path to the expected runtime location
-    subprocess.check_call(
-        [
-            "mount",
-            "--bind",
-            "/mnt/stateful_partition/var/lib/github",
-            "/var/lib/github",
-            "-o",
-            "rw,nodev,relatime",
-        ]
-    )
+    # Ensure destination exists with permissive mode (runner container writes here).
+    # makedirs applies the umask, so set the mode explicitly afterwards.
+    try:
+        os.makedirs(stateful_dir, mode=0o777)
+        logger.info(f"Created directory: {stateful_dir}")
+    except FileExistsError:
+        pass
+    os.chown(stateful_dir, 0, 0)
+    os.chmod(stateful_dir, 0o777)
+
+    # Bind-mount stateful path to the expected runtime location. Bind mounts
+    # ignore most flags on the initial call, so apply nodev/relatime with a
+    # remount, the same way mount(8) handles `--bind -o ...`.
+    _mount(stateful_dir, "/var/lib/github", MS_BIND)
+    _mount(None, "/var/lib/github", MS_REMOUNT | MS_BIND | MS_NODEV | MS_RELATIME)
 
 
 def main() -> None:
     logger.info("Starting GitHub Actions runner setup...")
-    configure_runner_dirs()
 
-    project_id = get_project_id()
-    region = get_region()
+    # Each metadata lookup is a round-trip to the metadata server; issue them
+    # concurrently and overlap them with the directory setup below.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        project_id_future = executor.submit(get_project_id)
+        region_future = executor.submit(get_region)
+        jit_future = executor.submit(get_jitconfig)
+
+        configure_runner_dirs()
+
+        project_id = project_id_future.result()
+        region = region_future.result()
+        jit = jit_future.result()
 
     logger.info("Configuring Docker registry mirrors...")
     try:
@@ -197,27 +271,62 @@ def main() -> None:
         logger.error("Error configuring Docker registry mirrors", exc_info=e)
         sys.exit(1)
 
-    # Allow non-root processes (e.g. the runner container) to talk to Docker
-    subprocess.check_call(["chmod", "a=rw", "/var/run/docker.sock"])
+    # Start pulling the runner image now so the download overlaps with the
+    # remaining setup; the container start reuses whatever has been fetched.
+    image = f"{virtual_repo}/{RUNNER_IMAGE}"
+    logger.info(f"Prefetching runner image: {image}")
+    prefetch = subprocess.Popen(
+        [DOCKER, "pull", "--quiet", image],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
 
+    # dockerd reads daemon.json on startup. Let systemd decide atomically:
+    # reload if docker.service is active or still activating (which may have
+    # read the old config already), do nothing if it hasn't been started yet.
     logger.info("Reloading docker configuration...")
     try:
-        subprocess.run(["systemctl", "reload", "docker"], check=True)
+        subprocess.run([SYSTEMCTL, "try-reload-or-restart", "docker"], check=True)
         logger.info("Docker configuration reloaded successfully")
     except Exception as e:
         logger.error("Error reloading Docker", exc_info=e)
         sys.exit(1)
 
+    # Allow non-root processes (e.g. the runner container) to talk to Docker.
+    # Done after the reload so a restart can't recreate the socket with its
+    # default mode; the socket must exist at this point (dockerd running or
+    # docker.socket listening), as it always has for this script.
+    os.chmod("/var/run/docker.sock", 0o666)
+
     logger.info("Runner setup complete, creating systemd unit and starting runner...")
     try:
-        write_systemd_unit(virtual_repo=virtual_repo)
-        subprocess.check_call(["systemctl", "daemon-reload"])
-        subprocess.check_call(["systemctl", "enable", "--now", "gha-runner.service"])
-        logger.info("gha-runner.service enabled and started")
+        write_systemd_unit(virtual_repo=virtual_repo, jit=jit)
+        # The unit is new, so systemd loads it from disk on `start` without a
+        # daemon-reload. It never needs enabling: the VM powers off when it exits.
+        subprocess.check_call([SYSTEMCTL, "start", "--no-block", "gha-runner.service"])
+        logger.info("gha-runner.service start queued")
     except Exception as e:
         logger.error("Failed to start gha-runner via systemd", exc_info=e)
         sys.exit(1)
 
+    # The runner no longer depends on the prefetch, but keep the client attached
+    # (up to a bound) so the pull isn't cancelled when this script exits.
+    try:
+        _, stderr = prefetch.communicate(timeout=PREFETCH_TIMEOUT_SECONDS)
+    except subprocess.TimeoutExpired:
+        prefetch.kill()
+        prefetch.communicate()
+        logger.warning(f"Runner image prefetch timed out after {PREFETCH_TIMEOUT_SECONDS}s")
+        return
+
+    if prefetch.returncode == 0:
+        logger.info("Runner image prefetch complete")
+    else:
+        logger.warning(
+            f"Runner image prefetch failed with exit code {prefetch.returncode}: "
+            f"{stderr.decode('utf-8', errors='replace').strip()}"
+        )
+
 
 def configure_docker(region: str, project_id: str) -> str:
     """Configure Docker daemon with registry mirror and recommended settings.
@@ -230,11 +339,21 @@ def configure_docker(region: str, project_id: str) -> str:
     """
     # /root is read-only, so use /tmp for the user docker config
     os.environ["DOCKER_CONFIG"] = "/tmp/.docker/"
-    Path(os.environ["DOCKER_CONFIG"]).mkdir(parents=True, exist_ok=True)
+    docker_config_dir = Path(os.environ["DOCKER_CONFIG"])
+    docker_config_dir.mkdir(parents=True, exist_ok=True)
 
-    # Ensure docker-credential-gcr is installed and configure Docker to use it for authentication
-    subprocess.check_call(
-        ["docker-credential-gcr", "configure-docker", "--registries", f"gcr.io,{region}-docker.pkg.dev"])
+    # Configure Docker to use docker-credential-gcr for authentication. This is
+    # the same edit `docker-credential-gcr configure-docker` makes, without
+    # paying for a fork/exec of the helper.
+    docker_config_path = docker_config_dir / "config.json"
+    try:
+        docker_config = _load_json(docker_config_path.read_bytes())
+    except FileNotFoundError:
+        docker_config = {}
+    cred_helpers = docker_config.setdefault("credHelpers", {})
+    for registry in ("gcr.io", f"{region}-docker.pkg.dev"):
+        cred_helpers[registry] = "gcr"
+    docker_config_path.write_bytes(_dump_json(docker_config))
 
     docker_dir = Path("/etc/docker")
     daemon_json_path = docker_dir / "daemon.json"
@@ -248,55 +367,51 @@ def configure_docker(region: str, project_id: str) -> str:
         raise
 
     # Load existing configuration or create new one
-    if daemon_json_path.exists():
-        with daemon_json_path.open("r") as f:
-            daemon_config = json.load(f)
+    try:
+        daemon_config = _load_json(daemon_json_path.read_bytes())
         logger.info("Loaded existing daemon.json configuration")
-    else:
+    except FileNotFoundError:
         logger.info("Creating new daemon.json configuration...")
         daemon_config = {}
 
     # Add or update registry mirrors: use a region-local Artifact Registry virtual repo
     virtual_repo = f"{region}-docker.pkg.dev/{project_id}/virtual"
-    daemon_config.setdefault("registry-mirrors", []).append(virtual_repo)
+    mirrors = daemon_config.setdefault("registry-mirrors", [])
+    dirty = virtual_repo not in mirrors
+    if dirty:
+        mirrors.append(virtual_repo)
 
     # Update other recommended settings
-    daemon_config["ipv6"] = True
-
-    # Write the updated configuration
-    with daemon_json_path.open("w") as f:
-        json.dump(daemon_config, f, indent=2)
-
-    logger.info(f"Successfully configured Docker registry mirror: {virtual_repo}")
+    if daemon_config.get("ipv6") is not True:
+        daemon_config["ipv6"] = True
+        dirty = True
+
+    # Write the updated configuration, leaving an already up-to-date file alone
+    if dirty:
+        daemon_json_path.write_bytes(_dump_json(daemon_config))
+        logger.info(f"Successfully configured Docker registry mirror: {virtual_repo}")
+    else:
+        logger.info(f"Docker registry mirror already configured: {virtual_repo}")
 
     return virtual_repo
 
 
-def write_systemd_unit(virtual_repo: str) -> Path:
-    """Create a systemd unit to manage the runner container and VM lifecycle.
-
-    The unit:
-    - Starts a Docker container running the `actions/runner` image with JIT config.
-    - Uses Google Cloud Logging (gcplogs) for container logs.
-    - Powers off the VM once the container exits (i.e., after the job completes).
-    """
-    unit_path = Path("/etc/systemd/system/gha-runner.service")
-    jit = get_jitconfig()
-
-    image = f"{virtual_repo}/actions/actions-runner:latest"
-    docker_run_line = (
-        "/usr/bin/docker run "
-        "--name gha-runner "
-        "--log-driver=gcplogs "
-        "--log-opt mode=non-blocking "
-        "--log-opt max-buffer-size=4m "
-        "--env DOCKER_BUILDKIT=1 "
-        "--volume /var/run/docker.sock:/var/run/docker.sock "
-        "--volume /var/lib/github:/runner/_work "
-        f"{image} ./run.sh --jitconfig {jit}"
-    )
-
-    unit_contents = f"""
+# Invariant `docker run` options for the runner container
+_DOCKER_RUN_OPTIONS = " ".join(
+    [
+        "--name gha-runner",
+        "--log-driver=gcplogs",
+        "--log-opt mode=non-blocking",
+        "--log-opt max-buffer-size=4m",
+        "--env DOCKER_BUILDKIT=1",
+        "--volume /var/run/docker.sock:/var/run/docker.sock",
+        "--volume /var/lib/github:/runner/_work",
+    ]
+)
+
+# systemd unit for the runner container; `{{`/`}}` escape systemd's own
+# `${JIT_CONFIG}` expansion from str.format.
+_UNIT_TEMPLATE = """\
 [Unit]
 Description=GitHub Actions Runner (container)
 After=docker.service
@@ -305,21 +420,48 @@ Requires=docker.service
 [Service]
 Type=exec
 Environment="DOCKER_CONFIG=/tmp/.docker"
+EnvironmentFile={env_path}
 
 # Start the container detached
-ExecStart={docker_run_line}
+ExecStart={docker} run {docker_run_options} {image} ./run.sh --jitconfig ${{JIT_CONFIG}}
 
 # Power off when it’s done
-ExecStopPost=/usr/bin/systemctl poweroff
+ExecStopPost={systemctl} poweroff
 
 # Don’t restart the unit; the container exit ends the VM
 RemainAfterExit=yes
+"""
 
-[Install]
-WantedBy=multi-user.target
-""".lstrip()
 
-    unit_path.write_text(unit_contents)
+def write_systemd_unit(virtual_repo: str, jit: str) -> Path:
+    """Create a systemd unit to manage the runner container and VM lifecycle.
+
+    `jit` is the runner JIT configuration, as returned by `get_jitconfig`. It is
+    written to a root-only environment file that the unit loads.
+
+    The unit:
+    - Starts a Docker container running the `actions/runner` image with JIT config.
+    - Uses Google Cloud Logging (gcplogs) for container logs.
+    - Powers off the VM once the container exits (i.e., after the job completes).
+    """
+    # /run is a tmpfs, which suits a unit that only lives for this boot
+    unit_path = Path("/run/systemd/system/gha-runner.service")
+    env_path = Path("/run/gha-runner.env")
+
+    # Keep the JIT config out of the (world-readable) unit file; create the
+    # environment file owner-only from the start rather than chmod-ing it later.
+    fd = os.open(env_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"JIT_CONFIG=%s\n" % jit.encode("ascii"))
+
+    unit_contents = _UNIT_TEMPLATE.format(
+        docker=DOCKER,
+        docker_run_options=_DOCKER_RUN_OPTIONS,
+        systemctl=SYSTEMCTL,
+        env_path=env_path,
+        image=f"{virtual_repo}/{RUNNER_IMAGE}",
+    )
+    unit_path.write_bytes(unit_contents.encode("utf-8"))
     logger.info(f"Wrote systemd unit: {unit_path}")
     return unit_path
 